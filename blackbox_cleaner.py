@@ -15,10 +15,15 @@ Objectifs :
 - Sauvegarde CSV + retour du DataFrame final
 
 Bibliothèques autorisées :
-    pandas, numpy, re, json, dateutil.parser, pathlib
+    pandas, numpy, re, json, dateutil, pathlib, itertools
+
+Accélérateurs optionnels (importés s'ils sont installés) :
+    orjson  : parsing JSON (repli sur json standard, aussi pour NaN/Infinity)
+    pyarrow : lecture NDJSON et écriture CSV (repli sur pandas / lecture ligne par ligne)
 """
 
 from pathlib import Path
+from itertools import islice
 import json
 import re
 from datetime import datetime
@@ -27,52 +32,179 @@ from dateutil import parser as dparser
 import numpy as np
 import pandas as pd
 
+try:  # Optionnel : parseur JSON en C (SIMD), repli sur json standard
+    import orjson
+except ImportError:
+    orjson = None
+
+try:  # Optionnel : lecture NDJSON et écriture CSV natives (C++, multithreadées)
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.json as pa_json
+except ImportError:
+    pa = pa_csv = pa_json = None
+
+# Regex compilées une seule fois pour le masquage
+_DIGIT_RE = re.compile(r"[0-9]")
+_EMAIL_RE = re.compile(r"[\w\.-]+@[\w\.-]+")
+
+# Nombre d'enregistrements NDJSON parsés en Python avant conversion en DataFrame
+_NDJSON_CHUNK_ROWS = 100_000
+
 
 # ---------------------------------------------------------------------------
 # ------------------------- CHARGEMENT FLEXIBLE JSON -------------------------
 # ---------------------------------------------------------------------------
+def _arrow_type_without_dates(t):
+    """Remplace les types date/timestamp inférés par Arrow par du texte brut."""
+    if pa.types.is_timestamp(t) or pa.types.is_date(t) or pa.types.is_time(t):
+        return pa.string()
+    return t
+
+
+def _read_ndjson_arrow(path):
+    """
+    Lit un NDJSON plat avec pyarrow.json.
+    Renvoie None si le fichier ne s'y prête pas (lignes invalides, objets
+    imbriqués ou listes) : json_normalize reste seul juge de l'aplatissement.
+    """
+    try:
+        table = pa_json.read_json(path)
+        if any(pa.types.is_struct(t) or pa.types.is_list(t) or pa.types.is_large_list(t)
+               for t in table.schema.types):
+            return None
+        # Les dates restent en texte : leur formatage est fait plus loin
+        schema = pa.schema([pa.field(f.name, _arrow_type_without_dates(f.type))
+                            for f in table.schema])
+        if not schema.equals(table.schema):
+            opts = pa_json.ParseOptions(explicit_schema=schema)
+            table = pa_json.read_json(path, parse_options=opts)
+    except (pa.ArrowException, OSError):
+        return None
+    return table.to_pandas()
+
+
+def _json_loads(data):
+    """
+    json.loads via orjson si disponible. orjson refuse les littéraux
+    NaN/Infinity (écrits par défaut par json.dump) : repli sur json standard.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def _records_to_frame(records):
+    """
+    Convertit une liste d'enregistrements JSON en DataFrame : json_normalize
+    uniquement si un objet imbriqué est présent, from_records (plus rapide) sinon.
+    """
+    for rec in records:
+        if not isinstance(rec, dict) or any(isinstance(v, dict) for v in rec.values()):
+            return pd.json_normalize(records)
+    return pd.DataFrame.from_records(records)
+
+
+def _probe_ndjson(path):
+    """
+    Lit le début du fichier : renvoie (is_ndjson, première ligne utile).
+    NDJSON si cette ligne est un objet {...} complet suivi d'autres lignes.
+    """
+    with open(path, "rb") as f:
+        lines = (ln.strip() for ln in f)
+        first = next((ln for ln in lines if ln), b"")
+        if first[:1] != b"{" or first[-1:] != b"}":
+            return False, first
+        return any(lines), first
+
+
+def _iter_json_lines(f):
+    """Parse un flux NDJSON ligne par ligne ; les lignes invalides sont ignorées."""
+    for ln in f:
+        ln = ln.strip()
+        if not ln:
+            continue
+        try:
+            yield _json_loads(ln)
+        except Exception:
+            pass
+
+
+def _read_json_lines(path, chunksize=_NDJSON_CHUNK_ROWS):
+    """
+    Lit un NDJSON en flux, par paquets de `chunksize` enregistrements
+    concaténés à la fin : la mémoire Python reste bornée à un paquet.
+    Renvoie None si aucune ligne n'est exploitable.
+    """
+    frames = []
+    with open(path, "rb") as f:
+        records = _iter_json_lines(f)
+        while True:
+            chunk = list(islice(records, chunksize))
+            if not chunk:
+                break
+            frames.append(_records_to_frame(chunk))
+    if not frames:
+        return None
+    if len(frames) == 1:
+        return frames[0]
+    # Un paquet entièrement nul laisse une colonne object : on ré-infère les types
+    return pd.concat(frames, ignore_index=True).infer_objects()
+
+
 def _load_json_flex(path):
     """
     Charge un fichier JSON de manière robuste :
     - JSON classique (liste ou dict)
-    - JSON newline-delimited (un objet par ligne)
+    - JSON newline-delimited (un objet par ligne), lu en flux
     - JSON avec structures imbriquées
     - Si tout échoue : renvoie un DataFrame vide
     """
     p = Path(path)
-    text = p.read_text(encoding="utf-8")
+    is_ndjson, first = _probe_ndjson(p)
 
-    # --- Cas 1 : JSON par lignes (NDJSON) ---
     try:
-        if "\n" in text and text.strip().count("\n") > 0:
-            lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-            objs = []
-            for ln in lines:
+        # --- Cas 1 : JSON par lignes (NDJSON) ---
+        if is_ndjson:
+            # Chemin rapide Arrow si la première ligne est un objet complet
+            if pa_json is not None:
                 try:
-                    objs.append(json.loads(ln))
-                except Exception:
-                    pass
-            if objs:
-                return pd.json_normalize(objs)
+                    first_ok = isinstance(_json_loads(first), dict)
+                except ValueError:
+                    first_ok = False
+                if first_ok:
+                    df = _read_ndjson_arrow(str(p))
+                    if df is not None:
+                        return df
+
+            df = _read_json_lines(p)
+            if df is not None:
+                return df
 
         # --- Cas 2 : JSON complet ---
-        obj = json.loads(text)
+        obj = _json_loads(p.read_bytes())
 
     except Exception:
-        # --- Cas 3 : Pandas read_json en secours ---
+        # --- Cas 3 : récupération des lignes valides, puis pandas en secours ---
         try:
+            df = _read_json_lines(p)
+            if df is not None:
+                return df
             return pd.read_json(p, orient="records", lines=True)
         except Exception:
             return pd.DataFrame()  # dernier recours
 
     # Normalisation du JSON en DataFrame
     if isinstance(obj, list):
-        return pd.json_normalize(obj)
+        return _records_to_frame(obj)
     if isinstance(obj, dict):
         for k, v in obj.items():
             if isinstance(v, list):
-                return pd.json_normalize(v)
-        return pd.json_normalize([obj])
+                return _records_to_frame(v)
+        return _records_to_frame([obj])
 
     return pd.DataFrame()
 
@@ -105,6 +237,19 @@ def _format_datetime(val):
     return ""
 
 
+def _format_datetime_series(series):
+    """Version colonne de _format_datetime : renvoie une Series de strings."""
+    # Dates déjà typées
+    if np.issubdtype(series.dtype, np.datetime64):
+        return series.dt.strftime("%d/%m/%Y %H:%M:%S").fillna("")
+
+    # Timestamps numériques ou chaînes hétérogènes : un seul appel à
+    # _format_datetime par valeur distincte (tolist : scalaires Python, comme apply)
+    codes, uniques = pd.factorize(series)
+    formatted = np.array([_format_datetime(v) for v in uniques.tolist()] + [""], dtype=object)
+    return pd.Series(formatted[codes], index=series.index, dtype=object)  # code -1 (NaN) -> ''
+
+
 # ---------------------------------------------------------------------------
 # --------------------------- MASQUAGE DES PII ------------------------------
 # ---------------------------------------------------------------------------
@@ -117,58 +262,168 @@ def _mask_email(email):
     return f"{masked}@{domain}"
 
 
-def _mask_national_id(val):
-    """Masque identifiant personnel : garde 3 premiers chars puis 'X'."""
-    s = str(val)
-    if not s:
-        return ""
-    return s[:3] + "X" * (len(s) - 3)
+def _mask_email_series(series):
+    """Masque une colonne d'emails ('' si invalide), sur le buffer numpy."""
+    return pd.Series([_mask_email(v) for v in series.to_numpy()], index=series.index, dtype=object)
 
 
-def _mask_internal_notes(val):
+def _mask_national_id_series(series):
+    """Masque une colonne d'identifiants : garde 3 premiers chars puis 'X'."""
+    # Tableau unicode numpy vu comme une matrice de code points (lignes x largeur)
+    values = series.astype(str).to_numpy(dtype=str)
+    lengths = np.char.str_len(values)
+    width = values.dtype.itemsize // 4
+    codes = values.view(np.uint32).reshape(len(values), width)
+    cols = np.arange(width)
+    codes[(cols >= 3) & (cols < lengths[:, None])] = ord("X")
+    result = np.where(series.isna().to_numpy(), "", values.astype(object))
+    return pd.Series(result, index=series.index, dtype=object)
+
+
+def _mask_internal_notes_series(series):
     """Supprime emails, remplace chiffres par X et limite à 200 chars."""
-    if pd.isna(val):
-        return ""
-    s = str(val)
-    s = re.sub(r"[0-9]", "X", s)
-    s = re.sub(r"[\w\.-]+@[\w\.-]+", "<masked_email>", s)
-    return s[:200] + ("..." if len(s) > 200 else "")
+    s = (
+        series.fillna("").astype(str)
+        .str.replace(_DIGIT_RE, "X", regex=True)
+        .str.replace(_EMAIL_RE, "<masked_email>", regex=True)
+    )
+    suffix = np.where(s.str.len().to_numpy() > 200, "...", "")
+    return s.str.slice(0, 200) + suffix
+
+
+def _mask_phone_series(series):
+    """Anonymise une colonne de téléphones : chaque chiffre devient X."""
+    return series.fillna("").astype(str).str.replace(_DIGIT_RE, "X", regex=True)
 
 
 # ---------------------------------------------------------------------------
 # ------------------ ARRONDI ET FORMATAGE DES NUMÉRIQUES --------------------
 # ---------------------------------------------------------------------------
-def _round_and_format_numeric(val):
-    """Arrondi 2 décimales si numérique, sinon renvoie string brute."""
-    if pd.isna(val):
-        return ""
-    try:
-        f = float(val)
-        return f"{np.round(f, 2):.2f}"
-    except Exception:
-        return str(val)
+def _round_and_format_numeric(arr):
+    """Arrondi 2 décimales d'un tableau numérique (1-D ou 2-D), formaté ('' si NaN)."""
+    # "{:.2f}".format sur des floats Python : plus rapide que np.char.mod,
+    # qui appelle lui aussi __mod__ élément par élément
+    fmt = "{:.2f}".format
+    flat = [fmt(x) for x in np.round(arr, 2).ravel().tolist()]
+    strs = np.array(flat, dtype=object).reshape(arr.shape)
+    if arr.dtype.kind == "f":
+        strs[np.isnan(arr)] = ""
+    return strs
 
 
 # ---------------------------------------------------------------------------
 # --------------------- DÉTECTION DE TYPES DE COLONNES ----------------------
 # ---------------------------------------------------------------------------
-def _is_datetime_column_name(name):
-    """Détecte une colonne date par son nom."""
-    if not isinstance(name, str):
-        return False
-    return any(p in name.lower() for p in
-               ("date", "time", "timestamp", "created", "updated"))
-
-
-def _is_pii_column(name):
-    """Détecte une colonne PII par son nom."""
-    if not isinstance(name, str):
-        return False
-    patterns = (
-        "email", "mail", "national", "nid", "ssn", "id_number",
-        "phone", "msisdn", "note", "notes"
-    )
-    return any(p in name.lower() for p in patterns)
+# Catégorie de nettoyage selon le nom de colonne : premier motif trouvé
+_NAME_CATEGORIES = {
+    "date": "date", "time": "date", "timestamp": "date",
+    "created": "date", "updated": "date",
+    "email": "email",
+    "national": "nid", "nid": "nid", "ssn": "nid",
+    "note": "note",
+    "phone": "phone", "msisdn": "phone",
+    "mail": "pii", "id_number": "pii",
+}
+
+
+def _classify_column(name, series):
+    """
+    Détermine la catégorie d'une colonne en un seul passage sur son nom :
+    date, email, nid, note, phone, pii (sans masquage dédié), number
+    (dtype numérique numpy) ou value.
+    """
+    if np.issubdtype(series.dtype, np.datetime64):
+        return "date"
+    if isinstance(name, str):
+        key = name.lower()
+        for pattern, category in _NAME_CATEGORIES.items():
+            if pattern in key:
+                return category
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in "iuf":
+        return "number"
+    return "value"
+
+
+# ---------------------------------------------------------------------------
+# ---------------------------- NETTOYAGE DES COLONNES ------------------------
+# ---------------------------------------------------------------------------
+def _format_numeric_block(frame):
+    """Arrondit et formate d'un seul tenant un bloc de colonnes numériques ('' si NaN)."""
+    strs = _round_and_format_numeric(frame.to_numpy(dtype=float))
+    return pd.DataFrame(strs, index=frame.index, columns=frame.columns, dtype=object)
+
+
+def _clean_value_series(series):
+    """Colonne object non typée par son nom : numérique arrondi, sinon string nettoyée."""
+    # 🔢 Numériques
+    coerced = pd.to_numeric(series, errors="coerce")
+    if coerced.notna().any():
+        # Masque NaN calculé une seule fois, formatage sur le buffer numpy
+        nan_mask = coerced.isna().to_numpy()
+        formatted = _round_and_format_numeric(coerced.to_numpy(dtype=float))
+        raw = series.fillna("").astype(str).to_numpy(dtype=object)
+        return pd.Series(np.where(nan_mask, raw, formatted), index=series.index, dtype=object)
+
+    # 🧹 String par défaut ; déjà 100% str sans NaN : strip seul, sans copies
+    if pd.api.types.infer_dtype(series, skipna=False) == "string":
+        return series.str.strip()
+    return series.fillna("").astype(str).str.strip()
+
+
+# Traitement vectorisé associé à chaque catégorie ; chacun renvoie
+# directement une colonne object de strings.
+_CLEANERS = {
+    "date": _format_datetime_series,
+    "email": _mask_email_series,
+    "nid": _mask_national_id_series,
+    "note": _mask_internal_notes_series,
+    "phone": _mask_phone_series,
+    "pii": lambda series: series.astype(str),
+    "value": _clean_value_series,
+}
+
+
+def _clean_frame(df):
+    """
+    Nettoie toutes les colonnes, regroupées par catégorie : les colonnes
+    numériques sont traitées en un seul bloc, les autres via _CLEANERS.
+    """
+    groups = {}
+    for col in df.columns:
+        groups.setdefault(_classify_column(col, df[col]), []).append(col)
+
+    cleaned = {}
+    for category, cols in groups.items():
+        if category == "number":
+            cleaned.update(_format_numeric_block(df[cols]).items())
+        else:
+            cleaner = _CLEANERS[category]
+            for col in cols:
+                cleaned[col] = cleaner(df[col])
+
+    # Ordre des colonnes d'origine conservé
+    return pd.DataFrame({col: cleaned[col] for col in df.columns}, index=df.index, copy=False)
+
+
+# ---------------------------------------------------------------------------
+# ------------------------------ ÉCRITURE CSV --------------------------------
+# ---------------------------------------------------------------------------
+def _write_csv(df, output_path):
+    """Écrit le CSV final (UTF-8, sans index), via l'écrivain Arrow si disponible."""
+    # Une seule colonne avec une valeur vide : Arrow écrirait une ligne vide
+    # (ignorée à la relecture) là où pandas écrit "" : pandas directement.
+    single_empty = len(df.columns) == 1 and (df.iloc[:, 0].isna() | (df.iloc[:, 0] == "")).any()
+    if pa_csv is not None and len(df.columns) and not single_empty:
+        # Arrow citerait toutes les chaînes en mode "needed" : on écrit sans
+        # guillemets et on laisse pandas gérer les valeurs à échapper.
+        opts = pa_csv.WriteOptions(quoting_style="none", quoting_header="none")
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            pa_csv.write_csv(table, str(output_path), write_options=opts)
+            return
+        except pa.ArrowException:
+            pass
+    df.to_csv(output_path, index=False, encoding="utf-8", chunksize=100_000)
 
 
 # ---------------------------------------------------------------------------
@@ -211,7 +466,14 @@ def clean_data(users_path: str, transactions_path: str, output_path: str) -> pd.
 
     # --- Fusion ---
     if common_key:
-        merged = pd.merge(tx_df, users_df, on=common_key, how="left", suffixes=("", "_user"))
+        # Colonnes users déjà présentes côté transactions : suffixe "_user"
+        # posé en amont, la fusion n'a plus de collisions à résoudre
+        overlap = {c: f"{c}_user" for c in users_df.columns
+                   if c != common_key and c in tx_df.columns}
+        if overlap:
+            users_df = users_df.rename(columns=overlap)
+        # Relation m:m possible (utilisateurs dupliqués) : pas de validate="m:1"
+        merged = pd.merge(tx_df, users_df, on=common_key, how="left", sort=False)
     else:
         merged = tx_df.copy()
         for c in users_df.columns:
@@ -226,56 +488,19 @@ def clean_data(users_path: str, transactions_path: str, output_path: str) -> pd.
                 break
 
     if "ID" not in merged.columns:
-        merged.insert(0, "ID", [f"TXN{i:06d}" for i in range(1, len(merged)+1)])
+        seq = np.arange(1, len(merged) + 1).astype(np.str_)
+        merged.insert(0, "ID", np.char.add("TXN", np.char.zfill(seq, 6)))
     else:
-        cols = list(merged.columns)
-        cols.insert(0, cols.pop(cols.index("ID")))
-        merged = merged[cols]
+        # Déplacement en tête sans réindexer (ni recopier) tout le DataFrame
+        merged.insert(0, "ID", merged.pop("ID"))
 
     # ------------------------------------------------------------------
-    # ------------------- NETTOYAGE COLONNE PAR COLONNE ----------------
+    # ------------------- NETTOYAGE PAR CATÉGORIE DE COLONNES ----------
     # ------------------------------------------------------------------
-    out = merged.copy()
-
-    for col in out.columns:
-        series = out[col]
-
-        # 🌐 Dates
-        if _is_datetime_column_name(col) or np.issubdtype(series.dtype, np.datetime64):
-            out[col] = series.apply(_format_datetime).astype(str)
-            continue
-
-        # 🔐 PII
-        if _is_pii_column(col):
-            key = col.lower()
-            if "email" in key:
-                out[col] = series.apply(lambda v: _mask_email(v) if not pd.isna(v) else "")
-            elif "national" in key or "nid" in key or "ssn" in key:
-                out[col] = series.apply(lambda v: _mask_national_id(v) if not pd.isna(v) else "")
-            elif "note" in key:
-                out[col] = series.apply(_mask_internal_notes)
-            elif "phone" in key or "msisdn" in key:
-                out[col] = series.apply(lambda v: re.sub(r"[0-9]", "X", str(v)) if not pd.isna(v) else "")
-            continue
-
-        # 🔢 Numériques
-        coerced = pd.to_numeric(series, errors="coerce")
-        if coerced.notna().any():
-            out[col] = [
-                f"{np.round(c, 2):.2f}" if not pd.isna(c) else (str(o) if not pd.isna(o) else "")
-                for o, c in zip(series, coerced)
-            ]
-            continue
-
-        # 🧹 String par défaut
-        out[col] = series.fillna("").astype(str).str.strip()
-
-    # Conversion finale 100% string
-    for col in out.columns:
-        out[col] = out[col].astype(str)
+    out = _clean_frame(merged)
 
     # Sauvegarde CSV (sans index)
-    out.to_csv(output_path, index=False, encoding="utf-8")
+    _write_csv(out, output_path)
 
     return out
 
@@ -0,0 +1,80 @@
+# tests/test_loaders.py
+"""
+Cohérence des chargeurs JSON : lecture Arrow, lecture NDJSON ligne par ligne
+(par paquets) et JSON complet doivent produire le même DataFrame.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import blackbox_cleaner as bc
+
+
+# Enregistrements plats : "score" est nul sur les 3 premières lignes
+# (paquet entièrement nul pour chunksize <= 3), dates laissées en texte
+FLAT = [
+    {"user_id": i, "name": f"user{i}", "score": None if i < 3 else i * 1.5,
+     "signup_date": f"2023-01-0{i + 1}T10:00:00"}
+    for i in range(7)
+]
+
+# Enregistrements imbriqués, avec une clé plate qui n'apparaît qu'après "address"
+NESTED = [
+    {"user_id": 1, "address": {"city": "Dakar", "geo": {"lat": 14.7}}},
+    {"user_id": 2, "address": {"city": "Thiès", "geo": {"lat": 14.8}}, "late": "x"},
+]
+
+
+def _write_ndjson(path, records):
+    path.write_text("\n".join(json.dumps(r) for r in records) + "\n", encoding="utf-8")
+    return path
+
+
+def _write_json(path, records):
+    path.write_text(json.dumps(records, indent=2), encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("chunksize", range(1, len(FLAT) + 2))
+def test_line_reader_matches_single_pass_at_chunk_boundaries(tmp_path, chunksize):
+    path = _write_ndjson(tmp_path / "flat.ndjson", FLAT)
+    df = bc._read_json_lines(path, chunksize=chunksize)
+    pd.testing.assert_frame_equal(df, bc._records_to_frame(FLAT))
+    assert df["score"].dtype == np.float64
+
+
+def test_whole_json_matches_line_reader(tmp_path):
+    ndjson = _write_ndjson(tmp_path / "flat.ndjson", FLAT)
+    whole = _write_json(tmp_path / "flat.json", FLAT)
+    pd.testing.assert_frame_equal(bc._load_json_flex(whole), bc._read_json_lines(ndjson))
+
+
+@pytest.mark.skipif(bc.pa_json is None, reason="pyarrow non installé")
+def test_arrow_matches_line_reader(tmp_path):
+    path = _write_ndjson(tmp_path / "flat.ndjson", FLAT)
+    df = bc._read_ndjson_arrow(str(path))
+    pd.testing.assert_frame_equal(df, bc._read_json_lines(path))
+
+
+@pytest.mark.skipif(bc.pa_json is None, reason="pyarrow non installé")
+def test_arrow_declines_nested_records(tmp_path):
+    path = _write_ndjson(tmp_path / "nested.ndjson", NESTED)
+    assert bc._read_ndjson_arrow(str(path)) is None
+
+
+@pytest.mark.parametrize("write", [_write_ndjson, _write_json])
+def test_nested_records_follow_json_normalize(tmp_path, write):
+    df = bc._load_json_flex(write(tmp_path / "nested", NESTED))
+    pd.testing.assert_frame_equal(df, pd.json_normalize(NESTED))
+    assert list(df.columns) == ["user_id", "address.city", "address.geo.lat", "late"]
+
+
+@pytest.mark.parametrize("write", [_write_ndjson, _write_json])
+def test_nan_literals_are_kept(tmp_path, write):
+    records = [{"id": 1, "amount": float("nan")}, {"id": 2, "amount": float("inf")}]
+    df = bc._load_json_flex(write(tmp_path / "nan", records))
+    assert df.shape == (2, 2)
+    assert np.isnan(df["amount"][0]) and np.isinf(df["amount"][1])